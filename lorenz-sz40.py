@@ -20,12 +20,15 @@
 # Lorenz Sz40 Cipher Machine simulator
 #
 
+import ast
 import sys
-import textwrap
-import argparse
-from pathlib import Path
-import random
-randgen = random.SystemRandom()
+import math
+import numpy as np
+# Numba is optional; without it crypt() uses the NumPy vector path.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 '''ASCII/TTY coding conversion data.'''
 
@@ -70,6 +73,12 @@ INVC, 158, 143, 137, 147,INVC, 24, 19, 14, 18, 16, 22, 11,
 # t   u   v   w   x   y   z    {     |    }    ~   DEL
   1, 28, 15, 25, 23, 21, 17, 158, INVC, 137, 154, INVC]
 
+# 256-entry translation table baking in the 7-bit mask, so the 1:1
+# ASCII-to-tagged-TTY mapping runs through bytes.translate() in C.
+# Invalid characters are dropped by the translate() delete argument.
+ASC2TTY_LUT = bytes(asc2tty[b & MSK7] for b in range(256))
+DELETE_INVALID = bytes(b for b in range(256) if asc2tty[b & MSK7] == INVC)
+
 # For converting 5-bits TTY code to ASCII.
 tty_ltrs2asc = [
     '\x00', 'T',         '\x0D',  'O', ' ', 'H', 'N', 'M',
@@ -83,6 +92,16 @@ tty_figs2asc = [
        '3', '+', 'Who Are You?',  '?', "'", '6', '&', '/',
        '-', '2',         '\x07', FIGS, '7', '1', '(', LTRS]
 
+# 32-entry bytes LUTs for tty2ascii, indexed by shift state. Shift
+# characters and multi-character expansions map to 0 here; they are
+# handled separately before the table lookup.
+TTY2ASC_LUTS = (
+    bytes(ord(v) if isinstance(v, str) and len(v) == 1 else 0
+          for v in tty_ltrs2asc),
+    bytes(ord(v) if isinstance(v, str) and len(v) == 1 else 0
+          for v in tty_figs2asc))
+TTY_WRU = 18    # "Who Are You?" code (figures shift)
+
 # Mike's convertion:
 # From http://www.codesandciphers.org.uk/lorenz/fish.htm
 #           0    1    2    3    4    5    6    7    8    9
@@ -119,81 +138,76 @@ def tty2blyprintout(s):
 
     return ''.join(result)
 
-def ascii2tty(s):
-    '''Convert from ASCII to 5-bits TTY code.
+def ascii2tty_chunk(s, figs):
+    '''One streaming step of ascii2tty: convert a chunk starting in
+    shift state figs (None = indeterminate) and return the converted
+    bytes together with the shift state to carry into the next chunk.'''
 
-    Assumes reader may initially be in either letters or figures
-    shift, and emits a shift char prior to first output char that
-    is not valid in either shift.'''
+    # Map ASCII to tagged TTY codes and drop invalid characters in a
+    # single C-level pass.
+    tagged = bytes(s).translate(ASC2TTY_LUT, DELETE_INVALID)
 
-    figs = False
-    result = []
-    # Emit initial shift if needed
-    if len(s) > 0:
-        char = asc2tty[s[0] & MSK7]
+    # Second pass only inserts the LTRS/FIGS shift characters.
+    result = bytearray()
+    for char in tagged:
         if (char & ETHR_F):
             # Valid in either shift
             pass
         elif (char & FIGS_F):
             # Must be in figures shift
-            result.append(chr(FIGS))
-            figs = True
-        else:
-            # Must be in letters shift
-            result.append(chr(LTRS))
+            if figs is not True:
+                # Not already in figures shift
+                # i.e. either in letters shift or indeterminate
+                result.append(FIGS)
+                figs = True
+        elif figs is not False:
+            # In figures or indeterminate shift, but must be in letter shift
+            result.append(LTRS)
             figs = False
-    
-    # Convert chars
-    for char in s:
-        # Drop MSB and convert
-        char = asc2tty[char & MSK7]
-
-        # Convert if valid
-        if char != INVC:
-
-            # Emit shift char if needed
-            if (char & ETHR_F):
-                # Valid in either shift
-                pass
-            elif (char & FIGS_F):
-                # Must be in figures shift
-                if figs is not True:
-                    # Not already in figures shift
-                    # i.e. either in letters shift or indeterminate
-                    result.append(chr(FIGS))
-                    figs = True
-            elif figs is not False:
-                # In figures or indeterminate shift, but must be in letter shift
-                result.append(chr(LTRS))
-                figs = False
-
-            # Emit the converted char
-            result.append(chr(char & MSK5))
 
-    return ''.join(result)
+        # Emit the converted char
+        result.append(char & MSK5)
 
+    return bytes(result), figs
 
-def tty2ascii(s):
-    '''Convert from 5-level TTY code to ASCII.
 
-    Assumes initial letters shift state.'''
+def ascii2tty(s):
+    '''Convert from ASCII to 5-bits TTY code, returned as bytes.
 
-    figs = False
-    result = []
+    Accepts bytes (or any iterable of ints). Assumes reader may
+    initially be in either letters or figures shift, and emits a shift
+    char prior to first output char that is not valid in either shift.'''
+
+    return ascii2tty_chunk(s, None)[0]
+
+
+def tty2ascii_chunk(s, figs):
+    '''One streaming step of tty2ascii: convert a chunk starting in
+    shift state figs and return the ASCII text together with the shift
+    state to carry into the next chunk.'''
+
+    result = bytearray()
     for char in s:
-        char = ord(char) & MSK5
+        char = char & MSK5
         if char == LTRS:
-            figs = False
+            figs = 0
         elif char == FIGS:
-            figs = True
+            figs = 1
+        elif figs and char == TTY_WRU:
+            # Multi-character expansion, too wide for the LUTs
+            result.extend(b'Who Are You?')
         else:
-            if figs:
-                char = tty_figs2asc[char]
-            else:
-                char = tty_ltrs2asc[char]
-            result.append(char)
+            result.append(TTY2ASC_LUTS[figs][char])
 
-    return ''.join(result)
+    return bytes(result).decode('latin1'), figs
+
+
+def tty2ascii(s):
+    '''Convert from 5-level TTY code to ASCII.
+
+    Accepts bytes. Assumes initial letters shift state.'''
+
+    return tty2ascii_chunk(s, 0)[0]
 
 
 class Wheel:
@@ -202,13 +216,18 @@ class Wheel:
     def __init__(self, wheel_data, initial):
         self.wheel_data = wheel_data
         self.wheel_size = len(wheel_data)
+        # Pins packed into an int bitmask, bit i = pin i, so get_val()
+        # is a single shift-and-mask.
+        self.mask = sum(bit << i for i, bit in enumerate(wheel_data))
         self.state = initial
 
     def advance(self):
-        self.state = (self.state + 1) % self.wheel_size
+        # Increment is always +1, so a compare-and-reset beats divmod
+        state = self.state + 1
+        self.state = state if state < self.wheel_size else 0
 
     def get_val(self):
-        return self.wheel_data[self.state]
+        return (self.mask >> self.state) & 1
 
     def get_current_pos(self):
         return self.state
@@ -219,31 +238,42 @@ class Wheel:
 
 
 class WheelBank:
-    """ Class for a bank of wheels. """
+    """ Class for a bank of wheels. Stores the wheel data
+        structure-of-arrays style -- state and size vectors plus one
+        pin array per wheel -- so whole-message keystream generation
+        can gather pins without touching the Wheel objects.
+    """
 
     def __init__(self, wheels):
-        self.wheels = wheels
+        self.states = np.array([w.state for w in wheels], dtype=np.uint16)
+        self.sizes = np.array([w.wheel_size for w in wheels], dtype=np.uint16)
+        self.pins = [np.asarray(w.wheel_data, dtype=np.uint8) for w in wheels]
+        # Ragged pin arrays flattened with an offset table, for kernels
+        # that cannot take a list of arrays.
+        self.pins_flat = np.concatenate(self.pins)
+        self.pin_offsets = np.concatenate(
+            ([0], np.cumsum(self.sizes)))[:-1].astype(np.int64)
 
     def advance(self):
-        for w in self.wheels:
-            w.advance()
+        self.states += 1
+        self.states[self.states == self.sizes] = 0
 
     def get_val(self):
-        result = []
-        for i in range(5):
-            result.append(self.wheels[i].get_val())
-        # Wheel numbered 1 is low bit, so we need to flip the bit order.
+        # Wheel numbered 1 is low bit.
         # NOTE: I'm not 100% sure which wheel has the MSB and which the
         # LSB. Would be nice to confirm this better. Diagrams seem to show
         # wheel K1, for example, on input 1. And a Baudot code chart nearby
         # shows bit #1 as LSB. So I think this is right...
-        return int("0b" + ''.join([str(i) for i in result[::-1]]), 2)
+        p, s = self.pins, self.states
+        return int(p[0][s[0]] | (p[1][s[1]] << 1) | (p[2][s[2]] << 2) |
+                   (p[3][s[3]] << 3) | (p[4][s[4]] << 4))
 
 
     def __repr__(self):
         result = []
-        for e in self.wheels:
-            result.append(str(e))
+        for state, size, pins in zip(self.states, self.sizes, self.pins):
+            result.append("State:" + str(state) + "; Size:" +
+                          str(size) + "; Wheel:" + str(list(pins)))
         return '\n'.join(result)
 
 
@@ -255,13 +285,82 @@ class MotorWheelBank(WheelBank):
     """
 
     def advance(self):
-        self.wheels[0].advance()
-        if self.wheels[0].get_val():
-            self.wheels[1].advance()
+        states = self.states
+        states[0] += 1
+        if states[0] == self.sizes[0]:
+            states[0] = 0
+        if self.pins[0][states[0]]:
+            states[1] += 1
+            if states[1] == self.sizes[1]:
+                states[1] = 0
 
 
     def is_active(self):
-        return self.wheels[1].get_val()
+        return int(self.pins[1][self.states[1]])
+
+
+_stream_cache = {}
+
+def _specialized_stream(k_sizes, s_sizes, m_sizes):
+    """ Build the full per-character machine step -- keystream readout,
+        XOR and all wheel advances, state arrays updated in place --
+        specialized to one set of wheel sizes. The source is generated
+        with the sizes, flat pin offsets and 5-way bit packing unrolled
+        as constants, so the compiler sees fixed comparisons and loads
+        instead of per-wheel loops, then compiled with Numba. Compiled
+        functions are cached per size tuple. Returns None when Numba is
+        unavailable; the NumPy keystream path is faster than a
+        generated pure-Python loop.
+    """
+    if njit is None:
+        return None
+    key = (k_sizes, s_sizes, m_sizes)
+    fn = _stream_cache.get(key)
+    if fn is not None:
+        return fn
+
+    k_offs = [sum(k_sizes[:w]) for w in range(5)]
+    s_offs = [sum(s_sizes[:w]) for w in range(5)]
+    lines = ['def _stream(k_states, k_pins, s_states, s_pins, '
+             'm_states, m_pins, data, out):']
+    for w in range(5):
+        lines.append('    k%d = k_states[%d]' % (w, w))
+        lines.append('    s%d = s_states[%d]' % (w, w))
+    lines.append('    m0 = m_states[0]')
+    lines.append('    m1 = m_states[1]')
+    lines.append('    for i in range(len(data)):')
+    k_expr = ' | '.join('(k_pins[%d + k%d] << %d)' % (k_offs[w], w, w)
+                        for w in range(5))
+    s_expr = ' | '.join('(s_pins[%d + s%d] << %d)' % (s_offs[w], w, w)
+                        for w in range(5))
+    lines.append('        out[i] = data[i] ^ (%s) ^ (%s)' % (k_expr, s_expr))
+    for w in range(5):
+        lines.append('        k%d += 1' % w)
+        lines.append('        if k%d == %d:' % (w, k_sizes[w]))
+        lines.append('            k%d = 0' % w)
+    lines.append('        m0 += 1')
+    lines.append('        if m0 == %d:' % m_sizes[0])
+    lines.append('            m0 = 0')
+    lines.append('        if m_pins[m0]:')
+    lines.append('            m1 += 1')
+    lines.append('            if m1 == %d:' % m_sizes[1])
+    lines.append('                m1 = 0')
+    lines.append('        if m_pins[%d + m1]:' % m_sizes[0])
+    for w in range(5):
+        lines.append('            s%d += 1' % w)
+        lines.append('            if s%d == %d:' % (w, s_sizes[w]))
+        lines.append('                s%d = 0' % w)
+    for w in range(5):
+        lines.append('    k_states[%d] = k%d' % (w, w))
+        lines.append('    s_states[%d] = s%d' % (w, w))
+    lines.append('    m_states[0] = m0')
+    lines.append('    m_states[1] = m1')
+
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    fn = njit(namespace['_stream'])
+    _stream_cache[key] = fn
+    return fn
 
 
 class LorenzCipher:
@@ -274,6 +373,52 @@ class LorenzCipher:
                                    for data, i in zip(S, initial[7:])])
         self.M_wheels = MotorWheelBank([Wheel(data, i)
                                         for data, i in zip(M, initial[5:8])])
+        self._K_table = None
+        self._K_period = 0
+        self._stream = _specialized_stream(
+            tuple(int(size) for size in self.K_wheels.sizes),
+            tuple(int(size) for size in self.S_wheels.sizes),
+            tuple(int(size) for size in self.M_wheels.sizes))
+
+    def precompute_K_table(self):
+        """ Precompute the combined K keystream over its full period
+            (lcm of the K wheel sizes, 22,041,682 for standard SZ40
+            wheels, so about 22 MB) as a uint8 table. Subsequent
+            crypt() calls under this key read K values by modular
+            index instead of gathering five pin arrays per call.
+            Worthwhile when many or large messages share one key.
+        """
+        kb = self.K_wheels
+        sizes = [int(size) for size in kb.sizes]
+        period = math.lcm(*sizes)
+        table = np.zeros(period, dtype=np.uint8)
+        # Fill in chunks to keep the int64 index temporaries small.
+        chunk = 1 << 22
+        for start in range(0, period, chunk):
+            steps = np.arange(start, min(start + chunk, period))
+            for bit in range(5):
+                table[start:start + len(steps)] |= \
+                    kb.pins[bit][steps % sizes[bit]] << bit
+        self._K_table = table
+        self._K_period = period
+
+    def _K_table_index(self):
+        """ Map the current K wheel positions to their index in the
+            precomputed table (built relative to all-zero positions)
+            by the Chinese remainder theorem. Returns None if the
+            wheel sizes are not pairwise coprime, in which case the
+            caller falls back to the gather path.
+        """
+        period = self._K_period
+        index = 0
+        for state, size in zip(self.K_wheels.states, self.K_wheels.sizes):
+            rest = period // int(size)
+            try:
+                inv = pow(rest, -1, int(size))
+            except ValueError:
+                return None
+            index = (index + int(state) * rest * inv) % period
+        return index
 
     def advance(self):
         """ Advances the wheels. Should be called after every encrypt or
@@ -300,10 +445,115 @@ class LorenzCipher:
         self.advance()
         return result
 
+    def _motor_schedule(self, n):
+        """ Run the M1/M2 motor pair forward n steps and return a uint8
+            array flagging the steps on which the S wheels advance.
+            Leaves the M wheels in their final positions.
+        """
+        bank = self.M_wheels
+        s1, s2 = int(bank.states[0]), int(bank.states[1])
+        n1, n2 = int(bank.sizes[0]), int(bank.sizes[1])
+        # Plain lists index faster than uint8 arrays in this loop
+        p1, p2 = bank.pins[0].tolist(), bank.pins[1].tolist()
+        active = np.empty(n, dtype=np.uint8)
+        for i in range(n):
+            s1 = s1 + 1 if s1 + 1 < n1 else 0
+            if p1[s1]:
+                s2 = s2 + 1 if s2 + 1 < n2 else 0
+            active[i] = p2[s2]
+        bank.states[0], bank.states[1] = s1, s2
+        return active
+
+    def _keystream(self, n):
+        """ Generate n characters of combined K+S keystream as a uint8
+            array, leaving all wheel state as if advance() had been
+            called n times.
+        """
+        steps = np.arange(n)
+        kb, sb = self.K_wheels, self.S_wheels
+
+        # K wheels advance once per character, so their pin bits can be
+        # gathered directly by position. Wheel 1 is the low bit. With a
+        # precomputed full-period table the five gathers collapse into
+        # one modular lookup.
+        stream = None
+        if self._K_table is not None:
+            offset = self._K_table_index()
+            if offset is not None:
+                stream = self._K_table[(offset + steps) % self._K_period]
+        if stream is None:
+            stream = np.zeros(n, dtype=np.uint8)
+            k_idx = (kb.states[:, None] + steps[None, :]) % kb.sizes[:, None]
+            for bit in range(5):
+                stream |= kb.pins[bit][k_idx[bit]] << bit
+
+        # S wheels advance only on active motor steps; the S wheel
+        # position for character i is the number of active steps among
+        # the first i advances.
+        active = self._motor_schedule(n)
+        s_steps = np.concatenate(([0], np.cumsum(active[:-1], dtype=np.int64)))
+        s_idx = (sb.states[:, None] + s_steps[None, :]) % sb.sizes[:, None]
+        for bit in range(5):
+            stream ^= sb.pins[bit][s_idx[bit]] << bit
+
+        total_active = int(active.sum())
+        kb.states = ((kb.states + np.int64(n)) % kb.sizes).astype(np.uint16)
+        sb.states = ((sb.states + np.int64(total_active))
+                     % sb.sizes).astype(np.uint16)
+        return stream
+
     def crypt(self, m):
-        """ Encrypt/decrypt a message string. Uses Baudot encoding. """
+        """ Encrypt/decrypt a message given as bytes of Baudot code,
+            returning bytes.
 
-        return ''.join([chr(self.crypt_char(ord(c))) for c in m])
+            Generates the whole keystream up front and XORs it against
+            the message in one vectorized pass, rather than calling
+            crypt_char() per character.
+        """
+        if len(m) == 0:
+            return b''
+        data = np.frombuffer(m, dtype=np.uint8)
+        if self._stream is not None:
+            kb, sb, mb = self.K_wheels, self.S_wheels, self.M_wheels
+            out = np.empty(len(m), dtype=np.uint8)
+            self._stream(kb.states, kb.pins_flat,
+                         sb.states, sb.pins_flat,
+                         mb.states, mb.pins_flat, data, out)
+            return out.tobytes()
+        stream = self._keystream(len(m))
+        return (data ^ stream).tobytes()
+
+    def crypt_stream(self, f_in, f_out, chunk=65536):
+        """ Encrypt/decrypt from one binary file object to another in
+            fixed-size chunks, so large tapes never sit in memory
+            whole. Wheel state carries across chunks, so the result
+            matches one crypt() call over the entire input.
+        """
+        while True:
+            block = f_in.read(chunk)
+            if not block:
+                break
+            f_out.write(self.crypt(block))
+
+    def crypt_batch(self, messages):
+        """ Encrypt/decrypt several messages that all start from this
+            machine's current wheel positions (i.e. a re-used key).
+            The keystream is generated once, at the longest message's
+            length, and XORed against each message; the XORs run
+            word-wide inside NumPy. Wheel positions are left where
+            they started, since every message uses the same indicator.
+        """
+        longest = max((len(m) for m in messages), default=0)
+        if longest == 0:
+            return [b'' for m in messages]
+        saved = (self.K_wheels.states.copy(), self.S_wheels.states.copy(),
+                 self.M_wheels.states.copy())
+        stream = np.frombuffer(self.crypt(bytes(longest)), dtype=np.uint8)
+        self.K_wheels.states, self.S_wheels.states, self.M_wheels.states = \
+            saved
+        return [(np.frombuffer(m, dtype=np.uint8)
+                 ^ stream[:len(m)]).tobytes() if m else b''
+                for m in messages]
 
 
 def write_keyfile(output_file, K_sizes, S_sizes, M_sizes,
@@ -325,13 +575,26 @@ def write_keyfile(output_file, K_sizes, S_sizes, M_sizes,
         f_out.write("indicator = %s\n\n" % str(indicator))
 
 
-class gather_args(argparse.Action):
-    def __call__(self, parser, namespace, values, option_string=None):
-        if not 'arg_sequence' in namespace:
-            setattr(namespace, 'arg_sequence', [])
-        prev = namespace.arg_sequence
-        prev.append((self.dest, values))
-        setattr(namespace, 'arg_sequence', prev)
+def read_keyfile(key_file):
+    """ Parse a key file written by write_keyfile(). Right-hand sides
+        are read with ast.literal_eval rather than exec()-ing the file,
+        so a key file cannot run arbitrary code. Returns a dict of the
+        assigned names.
+    """
+    values = {}
+    with open(key_file, 'r') as f_in:
+        for line in f_in:
+            line = line.split('#', 1)[0].strip()
+            if '=' in line:
+                name, _, value = line.partition('=')
+                try:
+                    values[name.strip()] = ast.literal_eval(value.strip())
+                except (ValueError, SyntaxError):
+                    sys.exit('"{}" is not a valid key file.'.format(key_file))
+    for name in ('K_wheels', 'S_wheels', 'M_wheels', 'indicator'):
+        if name not in values:
+            sys.exit('"{}" is missing {}.'.format(key_file, name))
+    return values
 
 
 def validate_args(infile):
@@ -342,6 +605,19 @@ def validate_args(infile):
 # Main entry point when called as an executable script.
 if __name__ == '__main__':
 
+    # CLI-only imports, kept off the library import path
+    import textwrap
+    import argparse
+    from pathlib import Path
+
+    class gather_args(argparse.Action):
+        def __call__(self, parser, namespace, values, option_string=None):
+            if not 'arg_sequence' in namespace:
+                setattr(namespace, 'arg_sequence', [])
+            prev = namespace.arg_sequence
+            prev.append((self.dest, values))
+            setattr(namespace, 'arg_sequence', prev)
+
     # Set up the command-line argument parser
     parser = argparse.ArgumentParser(
         prog='python3 lorenz.py',
@@ -395,30 +671,44 @@ if __name__ == '__main__':
 
 
     if cmd == 'keygen':
+        # Only keygen needs system randomness; don't touch /dev/urandom
+        # on other paths.
+        import random
+        randgen = random.SystemRandom()
         key_file = opt[0]
         K_sizes = [23, 26, 29, 31, 41]
         S_sizes = [59, 53, 51, 47, 43]
         M_sizes = [61, 37]
-        keygen_randombuf = '{:0573b}'.format(randgen.getrandbits(573))
+        # Pull pins and indicators straight out of one random int with
+        # shifts and masks; no bit-string formatting and slicing.
+        keygen_randombuf = randgen.getrandbits(
+            sum(K_sizes) + sum(M_sizes) + sum(S_sizes)
+            + 6 * (len(K_sizes) + len(M_sizes) + len(S_sizes)))
+        keygen_pos = 0
         K_wheels = [[], [], [], [], []]
         S_wheels = [[], [], [], [], []]
         M_wheels = [[], []]
         indicator = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
         for i in range(len(K_sizes)):
-            K_wheels[i] = list(map(int, list(keygen_randombuf[:K_sizes[i]])))
-            keygen_randombuf = keygen_randombuf[K_sizes[i]:]
-            indicator[i] = int(keygen_randombuf[:6], 2) % K_sizes[i]
-            keygen_randombuf = keygen_randombuf[6:]
+            K_wheels[i] = [(keygen_randombuf >> (keygen_pos + j)) & 1
+                           for j in range(K_sizes[i])]
+            keygen_pos += K_sizes[i]
+            indicator[i] = ((keygen_randombuf >> keygen_pos) & 63) % K_sizes[i]
+            keygen_pos += 6
         for i in range(len(M_sizes)):
-            M_wheels[i] = list(map(int, list(keygen_randombuf[:M_sizes[i]])))
-            keygen_randombuf = keygen_randombuf[M_sizes[i]:]
-            indicator[i + 5] = int(keygen_randombuf[:6], 2) % M_sizes[i]
-            keygen_randombuf = keygen_randombuf[6:]
+            M_wheels[i] = [(keygen_randombuf >> (keygen_pos + j)) & 1
+                           for j in range(M_sizes[i])]
+            keygen_pos += M_sizes[i]
+            indicator[i + 5] = ((keygen_randombuf >> keygen_pos) & 63) \
+                % M_sizes[i]
+            keygen_pos += 6
         for i in range(len(S_sizes)):
-            S_wheels[i] = list(map(int, list(keygen_randombuf[:S_sizes[i]])))
-            keygen_randombuf = keygen_randombuf[S_sizes[i]:]
-            indicator[i + 7] = int(keygen_randombuf[:6], 2) % S_sizes[i]
-            keygen_randombuf = keygen_randombuf[6:]
+            S_wheels[i] = [(keygen_randombuf >> (keygen_pos + j)) & 1
+                           for j in range(S_sizes[i])]
+            keygen_pos += S_sizes[i]
+            indicator[i + 7] = ((keygen_randombuf >> keygen_pos) & 63) \
+                % S_sizes[i]
+            keygen_pos += 6
         write_keyfile(key_file, K_sizes, S_sizes, M_sizes, K_wheels, S_wheels, M_wheels, indicator)
         print("New key data written to", key_file)
 
@@ -429,22 +719,23 @@ if __name__ == '__main__':
         output_file = opt[2]
         validate_args(input_file)
         validate_args(key_file)
-        with key_file.open('r') as key_file_contents:
-            exec(key_file_contents.read())
-        input_ascii = []
-        with input_file.open('rb') as f_input:
-            while f_input.peek():
-                input_ascii.append(ord(f_input.read(1)))
-
-        input_baudot = ascii2tty(input_ascii)
+        key = read_keyfile(key_file)
 
         print("Encrypting...")
-        cipher = LorenzCipher(K_wheels, S_wheels, M_wheels, indicator)
-
-        ciphertext = cipher.crypt(input_baudot)
-
-        with open(output_file, 'w') as f_out:
-            f_out.write(ciphertext)
+        cipher = LorenzCipher(key['K_wheels'], key['S_wheels'],
+                              key['M_wheels'], key['indicator'])
+
+        # Stream through conversion and encryption in chunks, carrying
+        # the shift state across chunk boundaries.
+        figs = None
+        with input_file.open('rb') as f_input, \
+                open(output_file, 'wb') as f_out:
+            while True:
+                block = f_input.read(65536)
+                if not block:
+                    break
+                input_baudot, figs = ascii2tty_chunk(block, figs)
+                f_out.write(cipher.crypt(input_baudot))
         print("Encrypted message written to: ", output_file)
 
 
@@ -454,23 +745,24 @@ if __name__ == '__main__':
         output_file = opt[2]
         validate_args(input_file)
         validate_args(key_file)
-        with open(key_file, 'r') as key_file_contents:
-            exec(key_file_contents.read())
-        input_ciphertext = []
-        with input_file.open('rb') as f:
-            while f.peek():
-                input_ciphertext.append(f.read(1))
+        key = read_keyfile(key_file)
 
         print("Decrypting...")
 
-        cipher = LorenzCipher(K_wheels, S_wheels, M_wheels, indicator)
-
-        plaintext_baudot = cipher.crypt(input_ciphertext)
-
-        plaintext_ascii = tty2ascii(plaintext_baudot)
-
-        with open(output_file, 'w') as f_out:
-            f_out.write(plaintext_ascii)
+        cipher = LorenzCipher(key['K_wheels'], key['S_wheels'],
+                              key['M_wheels'], key['indicator'])
+
+        # Stream through decryption and conversion in chunks, carrying
+        # the shift state across chunk boundaries.
+        figs = 0
+        with input_file.open('rb') as f, open(output_file, 'w') as f_out:
+            while True:
+                block = f.read(65536)
+                if not block:
+                    break
+                plaintext_ascii, figs = tty2ascii_chunk(
+                    cipher.crypt(block), figs)
+                f_out.write(plaintext_ascii)
         print("Decrypted message written to:", output_file)
 
 
@@ -478,7 +770,7 @@ if __name__ == '__main__':
         baudot_file = Path(opt[0])
         validate_args(baudot_file)
         print("Reading TTY tape file...")
-        with open(baudot_file, 'r') as f_in:
+        with open(baudot_file, 'rb') as f_in:
             bcode = f_in.read()
         print(tty2ascii(bcode))
 